@@ -3,19 +3,78 @@ Backend de Calculadora de Funciones
 Microservicio con FastAPI + SymPy para cálculos simbólicos
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import lru_cache
 import sympy as sp
 from sympy import latex, simplify, diff, integrate, Symbol
+from concurrent.futures import ThreadPoolExecutor
+from sympy.polys.matrices import DomainMatrix
+from sympy.polys.matrices.exceptions import DMNonInvertibleMatrixError
+from scipy import linalg as sla, optimize, sparse
+from scipy.sparse import linalg as spla
+from fractions import Fraction
+import numpy as np
 import uvicorn
+import asyncio
 import logging
+import cProfile
+import hashlib
+import hmac
+import io
+import math
+import multiprocessing
+import os
+import pstats
+import queue
+import sys
+import threading
+import time
+import uuid
+import warnings as warnings_module
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Configuración de perfilado (variables de entorno)
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "2000"))  # <= 0 desactiva el muestreo
+SLOW_LOG_SIZE = int(os.getenv("SLOW_LOG_SIZE", "200"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_TOP_FRAMES = int(os.getenv("PROFILE_TOP_FRAMES", "15"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Tamaño máximo del grafo de expresiones (nodos en memoria, LRU)
+GRAPH_MAX_NODES = int(os.getenv("GRAPH_MAX_NODES", "5000"))
+GRAPH_EVAL_CACHE_SIZE = int(os.getenv("GRAPH_EVAL_CACHE_SIZE", "256"))
+GRAPH_WORKERS = int(os.getenv("GRAPH_WORKERS", "2"))
+
+# Resolución de ecuaciones f(x) = 0
+SOLVE_SYMBOLIC_TIMEOUT_S = float(os.getenv("SOLVE_SYMBOLIC_TIMEOUT_S", "2"))
+SOLVE_WORKERS = int(os.getenv("SOLVE_WORKERS", "2"))
+SOLVE_MAX_SAMPLES = int(os.getenv("SOLVE_MAX_SAMPLES", "100000"))
+SOLVE_MAX_MULTIPLICITY = 4
+
+# Renderizado de resultados (str / LaTeX)
+RENDER_MAX_CHARS = int(os.getenv("RENDER_MAX_CHARS", "20000"))
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "2048"))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+
+# Sistemas lineales y valores propios
+MATRIX_EXACT_MAX_N = int(os.getenv("MATRIX_EXACT_MAX_N", "20"))              # eliminación exacta sobre racionales
+MATRIX_EXACT_EIGEN_MAX_N = int(os.getenv("MATRIX_EXACT_EIGEN_MAX_N", "4"))   # valores propios exactos (radicales)
+MATRIX_SPARSE_MIN_N = int(os.getenv("MATRIX_SPARSE_MIN_N", "200"))
+MATRIX_SPARSE_MAX_DENSITY = float(os.getenv("MATRIX_SPARSE_MAX_DENSITY", "0.05"))
+MATRIX_MAX_DENSE_N = int(os.getenv("MATRIX_MAX_DENSE_N", "5000"))
+MATRIX_MAX_NNZ = int(os.getenv("MATRIX_MAX_NNZ", "5000000"))
+MATRIX_EIGEN_VECTORS_MAX_N = int(os.getenv("MATRIX_EIGEN_VECTORS_MAX_N", "100"))
+MATRIX_WORKERS = int(os.getenv("MATRIX_WORKERS", "2"))
+
 # Inicializar FastAPI
 app = FastAPI(
     title="Calculadora de Funciones API",
@@ -32,12 +91,307 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ---------------------------------------------------------------------------
+# Perfilado de requests
+# ---------------------------------------------------------------------------
+# Traza de la request en curso: operación, función y tiempos por etapa.
+# El middleware crea el diccionario y los endpoints lo completan con stage().
+_request_trace: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_trace", default=None)
+
+# Registro acotado de requests lentas y de perfiles capturados bajo demanda
+slow_log: deque = deque(maxlen=SLOW_LOG_SIZE)
+profile_store: Dict[str, Dict[str, Any]] = {}
+_profile_order: deque = deque()
+_profile_lock = threading.Lock()
+_cprofile_lock = threading.Lock()  # cProfile no admite dos perfiles activos en el mismo hilo
+
+# Solo se muestrean frames de SymPy y de este servicio: es lo que interesa optimizar
+_SYMPY_PATH_MARKER = os.sep + "sympy" + os.sep
+_SERVICE_FILE = os.path.abspath(__file__)
+
+class RequestSamples:
+    """
+    Muestras de pila atribuidas a una request: frames de SymPy/servicio y su frecuencia.
+    El muestreador escribe y el middleware lee desde hilos distintos; al terminar
+    la request se cierra y se descartan las muestras de hilos que la sobrevivan.
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.closed = False
+        self._total: Counter = Counter()
+        self._own: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+
+    def add(self, frame):
+        if self.closed:
+            return
+        seen = set()
+        leaf = None
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename == _SERVICE_FILE or _SYMPY_PATH_MARKER in code.co_filename:
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if leaf is None:
+                    leaf = key
+                seen.add(key)
+            frame = frame.f_back
+        if leaf is None:
+            return
+        with self._lock:
+            if self.closed:
+                return
+            self._total.update(seen)
+            self._own[leaf] += 1
+            self.samples += 1
+
+    def hot_frames(self, limit: int = PROFILE_TOP_FRAMES) -> List[Dict[str, Any]]:
+        """Frames con más muestras (inclusivas), con su proporción sobre el total"""
+        with self._lock:
+            samples = self.samples
+            top = self._total.most_common(limit)
+            own = {key: self._own.get(key, 0) for key, _ in top}
+        if not samples:
+            return []
+        return [
+            {
+                "function": name,
+                "file": filename,
+                "line": line,
+                "samples": count,
+                "own_samples": own[(filename, line, name)],
+                "ratio": round(count / samples, 3),
+            }
+            for (filename, line, name), count in top
+        ]
+
+# Hilos que están trabajando para una request (ident del hilo -> traza).
+# El muestreador solo mira estos hilos y atribuye cada muestra a su request.
+_thread_traces: Dict[int, Dict[str, Any]] = {}
+_thread_traces_lock = threading.Lock()
+_sampling_active = threading.Event()
+
+@contextmanager
+def attributed_to(trace: Optional[Dict[str, Any]]):
+    """Atribuye a `trace` las muestras del hilo actual mientras dure el bloque"""
+    attach = trace is not None and trace.get("samples") is not None
+    ident = threading.get_ident()
+    if attach:
+        with _thread_traces_lock:
+            previous = _thread_traces.get(ident)
+            _thread_traces[ident] = trace
+            _sampling_active.set()
+    try:
+        yield
+    finally:
+        if attach:
+            with _thread_traces_lock:
+                if previous is None:
+                    _thread_traces.pop(ident, None)
+                else:
+                    _thread_traces[ident] = previous
+                if not _thread_traces:
+                    _sampling_active.clear()
+
+@contextmanager
+def stage(name: str, attach: bool = True):
+    """
+    Mide el tiempo de una etapa (parseo, cálculo, simplificación, render)
+    y lo acumula en la traza de la request actual, si existe.
+    Mientras dura, las muestras de este hilo se atribuyen a la request; las
+    etapas que esperan con await deben usar attach=False, porque en ese
+    intervalo el event loop ejecuta otras requests.
+    """
+    trace = _request_trace.get()
+    start = time.perf_counter()
+    try:
+        with attributed_to(trace if attach else None):
+            yield
+    finally:
+        if trace is not None:
+            elapsed = (time.perf_counter() - start) * 1000
+            trace["stages"][name] = round(trace["stages"].get(name, 0.0) + elapsed, 3)
+
+def run_traced(func, *args):
+    """
+    Ejecuta func en un hilo de un pool atribuyéndolo a la request en curso.
+    Se invoca como copy_context().run(run_traced, func, *args) para heredar la traza.
+    """
+    trace = _request_trace.get()
+    thread_profiles = trace.get("thread_profiles") if trace is not None else None
+    with attributed_to(trace):
+        if thread_profiles is None:
+            return func(*args)
+        # Request con X-Profile: cProfile es por hilo, así que el trabajo del
+        # pool se perfila aparte y el middleware combina las estadísticas
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args)
+        finally:
+            profiler.disable()
+            thread_profiles.append(profiler)
+
+def trace_request(operation: str, function: str):
+    """Asocia la operación y la expresión a la traza de la request actual"""
+    trace = _request_trace.get()
+    if trace is not None:
+        trace["operation"] = operation
+        trace["function"] = function
+
+class StackSampler:
+    """
+    Profiler de muestreo ligero y único en el proceso: un hilo daemon toma cada
+    `interval` segundos la pila de los hilos registrados con attributed_to()
+    y la suma a las muestras de su request. Duerme mientras no hay trabajo
+    atribuido y no usa sys.setprofile, por lo que puede estar siempre activo.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            _sampling_active.wait()
+            time.sleep(self.interval)
+            with _thread_traces_lock:
+                active = list(_thread_traces.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, trace in active:
+                frame = frames.get(ident)
+                # Hilos que siguen trabajando para una request ya terminada no se atribuyen
+                if frame is not None and not trace["samples"].closed:
+                    trace["samples"].add(frame)
+
+stack_sampler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000)
+
+def format_profile(profilers: List[cProfile.Profile], limit: int = PROFILE_TOP_FRAMES) -> str:
+    """Resumen de uno o más perfiles cProfile (event loop y pools) ordenado por tiempo acumulado"""
+    buffer = io.StringIO()
+    stats = pstats.Stats(*profilers, stream=buffer)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+    return buffer.getvalue()
+
+def store_profile(entry: Dict[str, Any]):
+    """Guarda un perfil bajo demanda, descartando los más antiguos"""
+    with _profile_lock:
+        profile_store[entry["id"]] = entry
+        _profile_order.append(entry["id"])
+        while len(_profile_order) > SLOW_LOG_SIZE:
+            profile_store.pop(_profile_order.popleft(), None)
+
+def profile_requested(request: Request) -> bool:
+    """El perfil completo se pide con la cabecera X-Profile o el parámetro ?profile"""
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return flag is not None and flag.lower() in ("1", "true", "yes", "on")
+
+@app.middleware("http")
+async def profiling_middleware(request: Request, call_next):
+    """
+    Mide cada request y:
+    - con X-Profile / ?profile=1 captura un perfil cProfile completo,
+      incluyendo el trabajo que la request delega a los pools de hilos
+    - si supera SLOW_REQUEST_THRESHOLD_MS la registra en el slow log
+      con sus tiempos por etapa y los frames calientes del muestreo
+    """
+    if request.url.path.startswith("/admin"):
+        return await call_next(request)
+
+    profiler = None
+    if profile_requested(request) and _cprofile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+    samples = None
+    if SLOW_REQUEST_THRESHOLD_MS > 0 or profiler is not None:
+        samples = RequestSamples()
+        stack_sampler.ensure_started()
+
+    trace = {
+        "operation": None,
+        "function": None,
+        "stages": {},
+        "samples": samples,
+        "thread_profiles": [] if profiler is not None else None,
+    }
+    token = _request_trace.set(trace)
+
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _cprofile_lock.release()
+    finally:
+        _request_trace.reset(token)
+        if samples is not None:
+            samples.close()
+    duration_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    request_id = uuid.uuid4().hex[:12]
+    response.headers["X-Process-Time-Ms"] = str(duration_ms)
+    entry = {
+        "id": request_id,
+        "timestamp": time.time(),
+        "method": request.method,
+        "path": request.url.path,
+        "status_code": response.status_code,
+        "operation": trace["operation"],
+        "function": trace["function"],
+        "duration_ms": duration_ms,
+        "stages": trace["stages"],
+    }
+
+    if profiler is not None:
+        store_profile({**entry, "hot_frames": samples.hot_frames(), "profile": format_profile([profiler, *trace["thread_profiles"]])})
+        response.headers["X-Profile-Id"] = request_id
+
+    if SLOW_REQUEST_THRESHOLD_MS > 0 and duration_ms >= SLOW_REQUEST_THRESHOLD_MS:
+        entry["hot_frames"] = samples.hot_frames()
+        slow_log.append(entry)
+        logger.warning(
+            f"Request lenta ({duration_ms} ms): {request.url.path} "
+            f"operación={trace['operation']} función={trace['function']} etapas={trace['stages']}"
+        )
+
+    return response
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Protege los endpoints de administración: exponen las expresiones enviadas
+    por todos los usuarios, así que sin ADMIN_TOKEN quedan deshabilitados
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Endpoints de administración deshabilitados: configure ADMIN_TOKEN")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+
 # Modelos Pydantic
 class FunctionRequest(BaseModel):
     function: str
     operation: str
     value: Optional[float] = None
     variable: Optional[str] = "x"
+    include_steps: bool = True
+    include_latex: bool = True
 
 class FunctionResponse(BaseModel):
     operation: str
@@ -45,6 +399,108 @@ class FunctionResponse(BaseModel):
     result: str
     steps: List[str]
     latex_result: Optional[str] = None
+    truncated: bool = False
+
+class GraphRegisterRequest(BaseModel):
+    function: str
+    variable: Optional[str] = "x"
+
+class GraphEvaluateRequest(BaseModel):
+    value: float
+
+class GraphNodeResponse(BaseModel):
+    id: str
+    operation: str
+    parent_id: Optional[str] = None
+    variable: str
+    result: str
+    steps: List[str]
+    latex_result: Optional[str] = None
+    truncated: bool = False
+    cached: bool
+
+class GraphEvaluateResponse(BaseModel):
+    id: str
+    value: float
+    result: str
+    numeric_result: Optional[float] = None
+    cached: bool
+
+class SolveRequest(BaseModel):
+    function: str
+    variable: Optional[str] = "x"
+    interval_min: float = -10.0
+    interval_max: float = 10.0
+    samples: int = 2000
+    timeout: Optional[float] = None
+
+class RootInfo(BaseModel):
+    value: float
+    exact: Optional[str] = None
+    latex: Optional[str] = None
+    multiplicity: int
+
+class SolveResponse(BaseModel):
+    function: str
+    variable: str
+    interval: List[float]
+    engine: str
+    roots: List[RootInfo]
+    steps: List[str]
+
+MatrixEntry = Union[int, float, str]
+
+class SparseMatrixInput(BaseModel):
+    shape: List[int]
+    rows: List[int]
+    cols: List[int]
+    values: List[MatrixEntry]
+
+class MatrixSolveRequest(BaseModel):
+    matrix: Optional[List[List[MatrixEntry]]] = None
+    sparse: Optional[SparseMatrixInput] = None
+    b: List[MatrixEntry]
+    method: str = "auto"
+    tol: float = 1e-10
+    max_iter: Optional[int] = None
+
+class MatrixSolveResponse(BaseModel):
+    method: str
+    n: int
+    solution: List[float]
+    exact_solution: Optional[List[str]] = None
+    residual_norm: float
+    relative_residual: float
+    condition_number: Optional[float] = None
+    iterations: Optional[int] = None
+    converged: bool = True
+    warnings: List[str]
+    steps: List[str]
+
+class MatrixEigenRequest(BaseModel):
+    matrix: Optional[List[List[MatrixEntry]]] = None
+    sparse: Optional[SparseMatrixInput] = None
+    method: str = "auto"
+    k: Optional[int] = None
+    which: str = "LM"
+    vectors: Optional[bool] = None
+
+class EigenInfo(BaseModel):
+    real: float
+    imag: float = 0.0
+    exact: Optional[str] = None
+    multiplicity: int = 1
+    vector: Optional[List[float]] = None
+    vector_imag: Optional[List[float]] = None
+
+class MatrixEigenResponse(BaseModel):
+    method: str
+    n: int
+    symmetric: bool
+    eigenvalues: List[EigenInfo]
+    max_residual: Optional[float] = None
+    warnings: List[str]
+    steps: List[str]
 
 class HealthResponse(BaseModel):
     status: str
@@ -63,6 +519,118 @@ VARIABLES = {
     't': t
 }
 
+# ---------------------------------------------------------------------------
+# Renderizado (str / LaTeX)
+# ---------------------------------------------------------------------------
+# Imprimir resultados grandes cuesta tanto como calcularlos: los textos se
+# memoizan por expresión (las expresiones SymPy son inmutables y hasheables)
+# y el renderizado de las respuestas corre en un pool fuera del event loop.
+_render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+
+class RenderedResult(NamedTuple):
+    result: str
+    steps: List[str]
+    latex_result: Optional[str]
+    truncated: bool
+
+def truncate_text(text: str, max_chars: Optional[int] = None) -> Tuple[str, bool]:
+    """Recorta textos que superan max_chars (por defecto RENDER_MAX_CHARS), indicando el tamaño original"""
+    max_chars = RENDER_MAX_CHARS if max_chars is None else max_chars
+    if len(text) <= max_chars:
+        return text, False
+    return f"{text[:max_chars]}… [truncado, {len(text)} caracteres]", True
+
+def _digits(n: int) -> int:
+    return int(abs(n).bit_length() * 0.30103) + 1 + (n < 0)
+
+def estimate_render_size(expr: sp.Basic, limit: int) -> int:
+    """
+    Estima, sin imprimir, el largo del texto de una expresión: dígitos de los
+    números, nombres de símbolos y funciones y unos caracteres por operador.
+    Deja de recorrer en cuanto supera `limit`, así que su costo está acotado.
+    """
+    size = 0
+    for node in sp.preorder_traversal(expr):
+        if isinstance(node, sp.Rational):
+            size += _digits(node.p) + (_digits(node.q) if node.q != 1 else 0)
+        elif isinstance(node, sp.Float):
+            size += 17
+        elif isinstance(node, sp.Symbol):
+            size += len(node.name)
+        elif isinstance(node, sp.Function):
+            size += len(type(node).__name__) + 2
+        elif isinstance(node, sp.Add):
+            size += 3 * (len(node.args) - 1)
+        elif isinstance(node, sp.Mul):
+            size += len(node.args) - 1
+        else:
+            size += 2
+        if size > limit:
+            break
+    return size
+
+def is_oversized(expr: sp.Basic) -> bool:
+    """True si la expresión excede RENDER_MAX_CHARS y no vale la pena imprimirla"""
+    return estimate_render_size(expr, RENDER_MAX_CHARS) > RENDER_MAX_CHARS
+
+def summarize_expression(expr: sp.Basic) -> str:
+    """Reemplazo del texto de una expresión demasiado grande para imprimir"""
+    return (f"[Resultado omitido: supera {RENDER_MAX_CHARS} caracteres "
+            f"({type(expr).__name__} con {len(expr.args)} argumentos)]")
+
+# Solo se cachean expresiones bajo el límite y salidas ya recortadas: los
+# resultados enormes no se imprimen ni se retienen en memoria.
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _cached_text(expr: sp.Basic) -> Tuple[str, bool]:
+    return truncate_text(str(expr))
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _cached_latex(expr: sp.Basic) -> Optional[str]:
+    text = latex(expr)
+    return text if len(text) <= RENDER_MAX_CHARS else None
+
+def render_text(expr: Union[sp.Basic, str]) -> Tuple[str, bool]:
+    """Texto de una expresión y si fue recortado u omitido por su tamaño"""
+    if isinstance(expr, str):
+        return expr, False
+    if is_oversized(expr):
+        return summarize_expression(expr), True
+    # La estimación es aproximada: _cached_text recorta igual como respaldo
+    return _cached_text(expr)
+
+def render_str(expr: Union[sp.Basic, str]) -> str:
+    """Texto de una expresión, memoizado y limitado a RENDER_MAX_CHARS"""
+    return render_text(expr)[0]
+
+def render_latex(expr: Optional[sp.Basic]) -> Optional[str]:
+    """
+    LaTeX de una expresión, memoizado. Un LaTeX recortado no compila,
+    así que si supera RENDER_MAX_CHARS se omite (None) sin llegar a imprimirlo.
+    """
+    if expr is None or isinstance(expr, str) or is_oversized(expr):
+        return None
+    return _cached_latex(expr)
+
+def render_result(operation: str, expr: sp.Expr, result: Union[sp.Expr, str], variable: str = 'x',
+                  include_steps: bool = True, include_latex: bool = True,
+                  latex_expr: Optional[sp.Expr] = None) -> RenderedResult:
+    """
+    Renderiza el resultado de una operación: texto, pasos y LaTeX.
+    Los pasos y el LaTeX solo se generan si el cliente los pide.
+    latex_expr permite renderizar en LaTeX una forma distinta a `result`.
+    """
+    result_str, truncated = render_text(result)
+    steps_result = result if isinstance(result, sp.Basic) else expr
+    steps = generate_steps(operation, expr, steps_result, variable) if include_steps else []
+    latex_result = render_latex(result if latex_expr is None else latex_expr) if include_latex else None
+    return RenderedResult(result_str, steps, latex_result, truncated)
+
+async def run_in_render_pool(func, *args):
+    """Ejecuta func en el pool de renderizado preservando la traza de la request"""
+    loop = asyncio.get_running_loop()
+    with stage("render", attach=False):
+        return await loop.run_in_executor(_render_executor, copy_context().run, run_traced, func, *args)
+
 def parse_function(func_str: str, variable: str = 'x') -> sp.Expr:
     """
     Parsea una función string a expresión SymPy
@@ -136,14 +704,16 @@ def generate_steps(operation: str, expr: sp.Expr, result: sp.Expr, variable: str
     Genera pasos detallados para diferentes operaciones
     """
     steps = []
+    expr_str = render_str(expr)
+    result_str = render_str(result)
     
     if operation == "evaluate":
-        steps.append(f"f({variable}) = {expr}")
+        steps.append(f"f({variable}) = {expr_str}")
         steps.append(f"Sustituyendo {variable} en la expresión")
-        steps.append(f"Resultado: {result}")
+        steps.append(f"Resultado: {result_str}")
         
     elif operation == "derive":
-        steps.append(f"f({variable}) = {expr}")
+        steps.append(f"f({variable}) = {expr_str}")
         steps.append(f"Aplicando regla de derivación: d/d{variable}(f({variable}))")
         
         # Mostrar reglas aplicadas según el tipo de función
@@ -156,10 +726,10 @@ def generate_steps(operation: str, expr: sp.Expr, result: sp.Expr, variable: str
         elif expr.has(sp.log):
             steps.append("Aplicando regla logarítmica: d/dx(ln(x)) = 1/x")
             
-        steps.append(f"Resultado: f'({variable}) = {result}")
+        steps.append(f"Resultado: f'({variable}) = {result_str}")
         
     elif operation == "integrate":
-        steps.append(f"f({variable}) = {expr}")
+        steps.append(f"f({variable}) = {expr_str}")
         steps.append(f"Calculando integral: ∫f({variable}) d{variable}")
         
         # Mostrar métodos aplicados
@@ -172,15 +742,951 @@ def generate_steps(operation: str, expr: sp.Expr, result: sp.Expr, variable: str
         elif expr.has(sp.log):
             steps.append("Aplicando integración por partes")
             
-        steps.append(f"Resultado: ∫f({variable}) d{variable} = {result} + C")
+        steps.append(f"Resultado: ∫f({variable}) d{variable} = {result_str} + C")
         
     elif operation == "simplify":
-        steps.append(f"Expresión original: {expr}")
+        steps.append(f"Expresión original: {expr_str}")
         steps.append("Aplicando simplificaciones algebraicas")
-        steps.append(f"Resultado simplificado: {result}")
+        steps.append(f"Resultado simplificado: {result_str}")
     
     return steps
 
+def compute_integral(expr: sp.Expr, variable: str = 'x') -> Tuple[Union[sp.Expr, str], Optional[sp.Expr]]:
+    """
+    Calcula la integral indefinida de una expresión
+    Retorna (integral simplificada o mensaje de error, integral a mostrar en LaTeX)
+    El renderizado queda a cargo del llamador.
+    """
+    # Inicializar variables
+    integral = None
+    integral_simplified = None
+    latex_expr = None
+
+    # Verificar que la expresión sea integrable
+    if expr.is_number and not expr.is_zero:
+        # Para constantes, la integral es c*x
+        integral = expr * sp.Symbol(variable)
+        integral_simplified = simplify(integral)
+        latex_expr = integral
+    else:
+        # Calcular integral
+        try:
+            integral = sp.integrate(expr, sp.Symbol(variable))
+        
+            # Si la integral no se puede resolver simbólicamente
+            if integral == expr:
+                # Intentar métodos alternativos
+                try:
+                    # Para funciones racionales
+                    if expr.is_rational_function():
+                        integral = sp.integrate(expr, sp.Symbol(variable))
+                    elif expr.is_polynomial():
+                        # Para polinomios, usar integración directa
+                        integral = sp.integrate(expr, sp.Symbol(variable))
+                    else:
+                        # Integral no resuelta simbólicamente
+                        integral_simplified = f"Integral no resuelta simbólicamente: ∫{render_str(expr)} d{variable}"
+                        latex_expr = None
+                except Exception as alt_error:
+                    logger.warning(f"Error en método alternativo: {alt_error}")
+                    integral_simplified = f"Integral no resuelta simbólicamente: ∫{render_str(expr)} d{variable}"
+                    latex_expr = None
+        
+            # Solo procesar si integral es una expresión válida
+            if isinstance(integral, sp.Expr):
+                integral_simplified = simplify(integral)
+                latex_expr = integral
+            elif isinstance(integral, str):
+                integral_simplified = integral
+                latex_expr = None
+            
+        except Exception as int_error:
+            logger.warning(f"Error específico en integración: {int_error}")
+            # Proporcionar información útil sobre el error
+            if "not implemented" in str(int_error):
+                integral_simplified = f"Integral no implementada para esta expresión: ∫{render_str(expr)} d{variable}"
+            elif "convergence" in str(int_error):
+                integral_simplified = f"Problema de convergencia en la integral: ∫{render_str(expr)} d{variable}"
+            elif "division by zero" in str(int_error):
+                integral_simplified = f"División por cero en la función: {render_str(expr)}"
+            else:
+                integral_simplified = f"No se pudo calcular la integral: ∫{render_str(expr)} d{variable}"
+            latex_expr = None
+    
+    return integral_simplified, latex_expr
+
+# ---------------------------------------------------------------------------
+# Grafo de expresiones (evaluación incremental)
+# ---------------------------------------------------------------------------
+class ExpressionNode:
+    """
+    Nodo del grafo: una expresión ya parseada con sus derivados memoizados.
+    El id depende solo del contenido, así que la misma expresión registrada
+    dos veces (o alcanzada por caminos distintos) reutiliza el mismo nodo.
+    """
+
+    def __init__(self, node_id: str, expr: sp.Expr, variable: str,
+                 operation: str = "function", parent_id: Optional[str] = None):
+        self.id = node_id
+        self.expr = expr
+        self.variable = variable
+        self.operation = operation
+        self.parent_id = parent_id
+        self.children: Dict[str, str] = {}     # operación -> id del nodo derivado
+        self.failures: Dict[str, str] = {}     # operación -> mensaje (p.ej. integral no resuelta)
+        self.evaluations: OrderedDict = OrderedDict()  # valor -> (resultado, numérico)
+        self._evaluator = None
+        self._lock = threading.Lock()
+
+    @property
+    def evaluator(self):
+        """Evaluador compilado con lambdify, creado la primera vez que se usa"""
+        if self._evaluator is None:
+            self._evaluator = sp.lambdify(sp.Symbol(self.variable), self.expr, modules="math")
+        return self._evaluator
+
+def expression_id(expr: sp.Expr, variable: str) -> str:
+    """Id estable derivado de la representación estructural de la expresión"""
+    return hashlib.sha1(f"{variable}:{sp.srepr(expr)}".encode()).hexdigest()[:16]
+
+def _derive_node(expr: sp.Expr, variable: str) -> sp.Expr:
+    return simplify(diff(expr, sp.Symbol(variable)))
+
+def _integrate_node(expr: sp.Expr, variable: str) -> sp.Expr:
+    integral, _ = compute_integral(expr, variable)
+    if isinstance(integral, str):
+        raise ValueError(integral)
+    if not isinstance(integral, sp.Expr) or integral.has(sp.Integral):
+        raise ValueError(f"Integral no resuelta simbólicamente: ∫{render_str(expr)} d{variable}")
+    return integral
+
+def _simplify_node(expr: sp.Expr, variable: str) -> sp.Expr:
+    return simplify(expr)
+
+# Operaciones que producen un nuevo nodo a partir de otro
+GRAPH_OPERATIONS = {
+    "derive": _derive_node,
+    "integrate": _integrate_node,
+    "simplify": _simplify_node,
+}
+
+class ExpressionGraph:
+    """
+    Registro en memoria de nodos de expresión con desalojo LRU.
+    Los nodos derivados se calculan de forma perezosa y se memoizan en el padre;
+    si un hijo fue desalojado se vuelve a calcular al pedirlo.
+    """
+
+    def __init__(self, max_nodes: int = GRAPH_MAX_NODES):
+        self.max_nodes = max_nodes
+        self._nodes: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def get(self, node_id: str) -> Optional[ExpressionNode]:
+        with self._lock:
+            node = self._nodes.get(node_id)
+            if node is not None:
+                self._nodes.move_to_end(node_id)
+            return node
+
+    def register(self, expr: sp.Expr, variable: str, operation: str = "function",
+                 parent_id: Optional[str] = None) -> Tuple[ExpressionNode, bool]:
+        """Agrega una expresión al grafo; retorna (nodo, ya_existía)"""
+        node_id = expression_id(expr, variable)
+        with self._lock:
+            node = self._nodes.get(node_id)
+            if node is not None:
+                self._nodes.move_to_end(node_id)
+                return node, True
+            node = ExpressionNode(node_id, expr, variable, operation, parent_id)
+            self._nodes[node_id] = node
+            while len(self._nodes) > self.max_nodes:
+                self._nodes.popitem(last=False)
+            return node, False
+
+    def derived(self, node: ExpressionNode, operation: str) -> Tuple[ExpressionNode, bool]:
+        """
+        Retorna el nodo derivado de `node` por `operation`, calculándolo solo si
+        no está memoizado. Lanza ValueError si la operación no tiene resultado.
+        """
+        with node._lock:
+            if operation in node.failures:
+                raise ValueError(node.failures[operation])
+            child_id = node.children.get(operation)
+            child = self.get(child_id) if child_id else None
+            if child is not None:
+                return child, True
+
+            with stage(operation):
+                try:
+                    result = GRAPH_OPERATIONS[operation](node.expr, node.variable)
+                except ValueError as e:
+                    node.failures[operation] = str(e)
+                    raise
+            child, _ = self.register(result, node.variable, operation, node.id)
+            node.children[operation] = child.id
+            return child, False
+
+    def evaluate(self, node: ExpressionNode, value: float) -> Tuple[str, Optional[float], bool]:
+        """
+        Evalúa el nodo en un punto con el evaluador compilado; si falla
+        (dominio, complejos) recurre a la sustitución simbólica
+        """
+        with node._lock:
+            if value in node.evaluations:
+                node.evaluations.move_to_end(value)
+                return (*node.evaluations[value], True)
+
+            with stage("evaluate"):
+                try:
+                    numeric = float(node.evaluator(value))
+                    result = str(sp.Float(numeric))
+                except (ValueError, TypeError, ZeroDivisionError, OverflowError):
+                    exact = simplify(node.expr.subs(node.variable, value))
+                    result = str(exact)
+                    numeric = float(exact) if exact.is_real and exact.is_finite else None
+
+            if numeric is not None and not math.isfinite(numeric):
+                numeric = None
+            node.evaluations[value] = (result, numeric)
+            while len(node.evaluations) > GRAPH_EVAL_CACHE_SIZE:
+                node.evaluations.popitem(last=False)
+            return result, numeric, False
+
+expression_graph = ExpressionGraph()
+
+# derive/integrate/simplify y la evaluación pueden tardar segundos y toman el
+# lock del nodo: corren en un pool para no bloquear el event loop
+_graph_executor = ThreadPoolExecutor(max_workers=GRAPH_WORKERS, thread_name_prefix="graph")
+
+async def run_in_graph_pool(func, *args):
+    """Ejecuta una operación del grafo fuera del event loop preservando la traza de la request"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_graph_executor, copy_context().run, run_traced, func, *args)
+
+# ---------------------------------------------------------------------------
+# Resolución de f(x) = 0 (simbólica con presupuesto de tiempo + numérica)
+# ---------------------------------------------------------------------------
+# solveset no se puede interrumpir dentro de un hilo: corre en procesos propios
+# que se matan y se reemplazan al vencer el presupuesto, así un cálculo
+# abandonado no sigue ocupando un worker ni compitiendo por el GIL.
+# Los hilos de _solve_executor solo esperan la respuesta del proceso.
+_solve_executor = ThreadPoolExecutor(max_workers=SOLVE_WORKERS, thread_name_prefix="solveset")
+# El respaldo numérico usa otro pool para no esperar detrás de los hilos que aguardan a solveset
+_numeric_solve_executor = ThreadPoolExecutor(max_workers=SOLVE_WORKERS, thread_name_prefix="solve-numeric")
+
+IDENTICALLY_ZERO_MESSAGE = "La función es idénticamente cero: todo punto es raíz"
+
+def solve_symbolic(expr: sp.Expr, variable: str, a: float, b: float) -> Optional[List[RootInfo]]:
+    """
+    Raíces exactas en [a, b]. Se resuelve sobre los reales y después se filtra
+    por el intervalo: con domain=Interval solveset suele dejar una Intersection
+    sin evaluar incluso para polinomios.
+    Retorna None si el resultado no es un conjunto finito de raíces.
+    """
+    sym = sp.Symbol(variable)
+
+    # Polinomios (o el numerador de una función racional): real_roots da raíces
+    # reales exactas (CRootOf si no hay radicales reales) con su multiplicidad
+    numerator, denominator = sp.together(expr).as_numer_denom()
+    if numerator.is_polynomial(sym) and denominator.is_polynomial(sym):
+        numerator_poly, denominator_poly = sp.Poly(numerator, sym), sp.Poly(denominator, sym)
+        # Raíces comunes con el denominador: f no está definida ahí
+        common = sp.gcd(numerator_poly, denominator_poly)
+        excluded = set(sp.real_roots(common)) if common.degree() > 0 else set()
+        roots = []
+        for root, multiplicity in Counter(sp.real_roots(numerator_poly)).items():
+            value = float(root.evalf())
+            if root in excluded or not a <= value <= b:
+                continue
+            roots.append(RootInfo(value=value, exact=render_str(root), latex=render_latex(root), multiplicity=multiplicity))
+        return sorted(roots, key=lambda r: r.value)
+
+    solutions = sp.solveset(expr, sym, domain=sp.S.Reals)
+    if not isinstance(solutions, sp.FiniteSet):
+        # Soluciones periódicas (ImageSet): la intersección con [a, b] suele ser finita
+        solutions = solutions.intersect(sp.Interval(a, b))
+    if solutions is sp.S.EmptySet:
+        return []
+    if not isinstance(solutions, sp.FiniteSet):
+        return None
+
+    roots = []
+    for root in solutions:
+        value = root.evalf(chop=True)
+        if not value.is_real:
+            return None
+        if not a <= float(value) <= b:
+            continue
+        multiplicity = 1
+        derivative = expr
+        while multiplicity < SOLVE_MAX_MULTIPLICITY:
+            derivative = diff(derivative, sym)
+            if not simplify(derivative.subs(sym, root)).is_zero:
+                break
+            multiplicity += 1
+        roots.append(RootInfo(value=float(value), exact=render_str(root), latex=render_latex(root), multiplicity=multiplicity))
+    return sorted(roots, key=lambda r: r.value)
+
+def _solve_worker_main(conn):
+    """Bucle de un proceso de solveset: recibe los argumentos de solve_symbolic y responde (ok, resultado)"""
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, solve_symbolic(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+class SolveWorker:
+    """Proceso de solveset con su canal; restart() lo mata y lo reemplaza"""
+
+    # forkserver: los procesos nacen de un servidor que ya importó este módulo
+    # (arranque rápido) y no heredan los hilos ni locks del servicio
+    _context = multiprocessing.get_context("forkserver")
+
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        parent_conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(target=_solve_worker_main, args=(child_conn,),
+                                             name="solveset", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def restart(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.start()
+
+    def call(self, args: tuple, timeout: float):
+        """Ejecuta solve_symbolic(*args); si no responde en `timeout` segundos mata el proceso"""
+        self.conn.send(args)
+        if not self.conn.poll(timeout):
+            self.restart()
+            raise TimeoutError
+        ok, payload = self.conn.recv()
+        if not ok:
+            raise RuntimeError(payload)
+        return payload
+
+class SolveWorkerPool:
+    """
+    Conjunto fijo de SOLVE_WORKERS procesos de solveset. Cada llamada toma un
+    proceso libre dentro del mismo plazo que el cálculo: nunca se espera más
+    que el presupuesto de la request, aunque todos estén ocupados.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: queue.Queue = queue.Queue()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._started:
+            return
+        with self._start_lock:
+            if not self._started:
+                SolveWorker._context.set_forkserver_preload([__name__])
+                for _ in range(self.size):
+                    self._idle.put(SolveWorker())
+                self._started = True
+
+    def solve(self, deadline: float, *args) -> Optional[List[RootInfo]]:
+        """solve_symbolic(*args) en un proceso libre; TimeoutError si no termina antes de `deadline` (monotonic)"""
+        self.ensure_started()
+        try:
+            worker = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise TimeoutError
+        try:
+            return worker.call(args, max(0.0, deadline - time.monotonic()))
+        except TimeoutError:
+            raise
+        except (EOFError, OSError):
+            # El proceso murió (p.ej. sin memoria): se reemplaza
+            worker.restart()
+            raise RuntimeError("El proceso de solveset terminó inesperadamente")
+        finally:
+            self._idle.put(worker)
+
+solve_workers = SolveWorkerPool(SOLVE_WORKERS)
+
+@app.on_event("startup")
+def start_solve_workers():
+    """Arranca los procesos de solveset antes de la primera request"""
+    solve_workers.ensure_started()
+
+def _vectorized(expr: sp.Expr, sym: sp.Symbol):
+    """lambdify con NumPy que siempre retorna un arreglo real del tamaño de la entrada"""
+    func = sp.lambdify(sym, expr, modules="numpy")
+
+    def evaluate(xs):
+        with np.errstate(all="ignore"):
+            ys = np.asarray(func(xs))
+            if np.iscomplexobj(ys):
+                ys = np.where(np.abs(ys.imag) < 1e-12, ys.real, np.nan)
+            return np.broadcast_to(ys.astype(float), np.shape(xs))
+    return evaluate
+
+def solve_numeric(node: ExpressionNode, a: float, b: float, samples: int) -> Tuple[List[RootInfo], List[str]]:
+    """
+    Busca raíces con un barrido vectorizado en [a, b]:
+    - cambios de signo entre muestras -> refinamiento con Brent
+    - mínimos locales de |f| sin cambio de signo (raíces de multiplicidad par) -> Newton
+    La derivada sale del grafo de expresiones, así que se reutiliza si ya fue calculada.
+    """
+    sym = sp.Symbol(node.variable)
+    f = _vectorized(node.expr, sym)
+    derivative_node, _ = expression_graph.derived(node, "derive")
+    fprime = _vectorized(derivative_node.expr, sym)
+
+    def f_scalar(v):
+        return float(f(np.array([v]))[0])
+
+    def fprime_scalar(v):
+        return float(fprime(np.array([v]))[0])
+
+    xs = np.linspace(a, b, samples)
+    ys = f(xs)
+    finite = np.isfinite(ys)
+    # Identidades como sin(x)^2 + cos(x)^2 - 1 dan solo ceros y ruido de redondeo:
+    # se confirma con la forma simplificada (memoizada en el grafo)
+    if finite.any() and float(np.max(np.abs(ys[finite]))) <= 1e-12:
+        simplified, _ = expression_graph.derived(node, "simplify")
+        if simplified.expr.is_zero:
+            raise ValueError(IDENTICALLY_ZERO_MESSAGE)
+    # Escala propia de la función (sin piso): las tolerancias son relativas a ella
+    scale = float(np.nanmedian(np.abs(ys[finite]))) if finite.any() else 0.0
+    if scale == 0:
+        scale = 1.0
+    step = (b - a) / (samples - 1)
+
+    # Brackets con cambio de signo y ceros exactos sobre la malla
+    both_finite = finite[:-1] & finite[1:]
+    sign_change = both_finite & (np.sign(ys[:-1]) * np.sign(ys[1:]) < 0)
+    brackets = np.flatnonzero(sign_change)
+    exact_zeros = np.flatnonzero(finite & (ys == 0))
+
+    # Candidatos a raíz de multiplicidad par: mínimos locales de |f| cercanos a cero
+    abs_ys = np.where(finite, np.abs(ys), np.inf)
+    interior = np.arange(1, samples - 1)
+    local_min = (abs_ys[interior] <= abs_ys[interior - 1]) & (abs_ys[interior] <= abs_ys[interior + 1])
+    touch = interior[local_min & (abs_ys[interior] < 1e-2 * scale) & (ys[interior] != 0)]
+
+    candidates = [float(xs[i]) for i in exact_zeros]
+    for i in brackets:
+        try:
+            candidates.append(optimize.brentq(f_scalar, xs[i], xs[i + 1], xtol=1e-14, maxiter=200))
+        except (ValueError, RuntimeError):
+            continue
+    for i in touch:
+        try:
+            candidates.append(float(optimize.newton(f_scalar, xs[i], fprime=fprime_scalar, tol=1e-14, maxiter=100)))
+        except (RuntimeError, ZeroDivisionError, OverflowError):
+            continue
+
+    # Validar (descarta polos detectados como cambio de signo) y eliminar duplicados
+    tolerance = 1e-6 * scale
+    accepted: List[float] = []
+    for candidate in sorted(candidates):
+        if not (a <= candidate <= b) or not abs(f_scalar(candidate)) <= tolerance:
+            continue
+        if accepted and abs(candidate - accepted[-1]) <= max(1e-7 * max(1.0, abs(candidate)), step * 1e-3):
+            continue
+        accepted.append(candidate)
+
+    roots = [RootInfo(value=r, multiplicity=numeric_multiplicity(node, r, step)) for r in accepted]
+    steps = [
+        f"Barrido de {samples} puntos en [{a}, {b}]",
+        f"Cambios de signo detectados: {len(brackets)} (refinados con Brent)",
+        f"Mínimos locales de |f| cercanos a cero: {len(touch)} (refinados con Newton usando f')",
+    ]
+    return roots, steps
+
+def numeric_multiplicity(node: ExpressionNode, root: float, step: float) -> int:
+    """
+    Estima la multiplicidad contando derivadas que se anulan en la raíz.
+    "Se anula" es relativo: |f^(k)(r)| se compara con la magnitud de f^(k)
+    en el bracket [r - step, r + step], sin piso absoluto, para que funciones
+    de escala pequeña (p.ej. 1e-8*(x-1)) no parezcan tener raíces múltiples.
+    """
+    sym = sp.Symbol(node.variable)
+    points = np.array([root, root - step, root - step / 2, root + step / 2, root + step])
+    multiplicity = 1
+    current = node
+    while multiplicity < SOLVE_MAX_MULTIPLICITY:
+        current, _ = expression_graph.derived(current, "derive")
+        values = _vectorized(current.expr, sym)(points)
+        if not np.all(np.isfinite(values)):
+            break
+        local_scale = float(np.max(np.abs(values[1:])))
+        if local_scale == 0 or abs(values[0]) > 1e-6 * local_scale:
+            break
+        multiplicity += 1
+    return multiplicity
+
+async def node_response(node: ExpressionNode, cached: bool, parent: Optional[ExpressionNode] = None,
+                        operation: Optional[str] = None, as_root: bool = False) -> GraphNodeResponse:
+    """
+    Construye la respuesta de un nodo, con los pasos respecto a su padre.
+    Un nodo compartido puede alcanzarse por varios caminos (p.ej. integrar la
+    derivada vuelve a la función original), así que el llamador puede indicar
+    el padre y la operación realmente aplicados. Con as_root se presenta como
+    función registrada, ignorando el padre con el que se creó.
+    """
+    if as_root:
+        parent, operation = None, "function"
+    elif parent is None and node.parent_id:
+        parent = expression_graph.get(node.parent_id)
+        operation = node.operation
+    if parent is not None:
+        rendered = await run_in_render_pool(render_result, operation, parent.expr, node.expr, node.variable)
+        steps = rendered.steps
+    else:
+        rendered = await run_in_render_pool(render_result, "function", node.expr, node.expr, node.variable, False)
+        steps = [f"f({node.variable}) = {rendered.result}"]
+    return GraphNodeResponse(
+        id=node.id,
+        operation=operation or node.operation,
+        parent_id=parent.id if parent is not None else None,
+        variable=node.variable,
+        result=rendered.result,
+        steps=steps,
+        latex_result=rendered.latex_result,
+        truncated=rendered.truncated,
+        cached=cached
+    )
+
+# ---------------------------------------------------------------------------
+# Sistemas lineales y valores propios
+# ---------------------------------------------------------------------------
+# El método se elige según la entrada:
+# - racionales y pequeña -> eliminación exacta (LU sobre QQ) / eigenvects de SymPy
+# - numérica densa       -> LAPACK (LU con estimación de condición / eig, eigh)
+# - dispersa o grande con pocos no ceros -> SuperLU, Krylov (cg, gmres, bicgstab), eigs/eigsh
+_matrix_executor = ThreadPoolExecutor(max_workers=MATRIX_WORKERS, thread_name_prefix="matrix")
+
+SOLVE_METHODS = ("auto", "exact", "lapack", "lstsq", "lsmr", "sparse_direct", "cg", "gmres", "bicgstab")
+LEAST_SQUARES_METHODS = ("lstsq", "lsmr")
+EIGEN_METHODS = ("auto", "exact", "lapack", "sparse")
+ITERATIVE_SOLVERS = {"cg": spla.cg, "gmres": spla.gmres, "bicgstab": spla.bicgstab}
+
+# Orden de los valores propios según `which` (mismas claves que ARPACK); se
+# aplica a todos los métodos para que k y el orden de la respuesta coincidan
+EIGEN_ORDER = {
+    "LM": lambda v: -abs(v), "SM": lambda v: abs(v),
+    "LR": lambda v: -v.real, "SR": lambda v: v.real,
+    "LA": lambda v: -v.real, "SA": lambda v: v.real,
+    "LI": lambda v: -v.imag, "SI": lambda v: v.imag,
+}
+# eigsh solo acepta LA/SA para la parte real y eigs solo LR/SR
+ARPACK_WHICH = {True: {"LR": "LA", "SR": "SA"}, False: {"LA": "LR", "SA": "SR"}}
+
+class ParsedMatrix(NamedTuple):
+    shape: Tuple[int, int]
+    exact: Optional[sp.Matrix]          # solo si todas las entradas son racionales y la matriz es pequeña
+    dense: Optional[np.ndarray]
+    sparse: Optional[sparse.csr_matrix]
+
+def parse_matrix_entry(value: MatrixEntry, exact: bool) -> Union[Fraction, float]:
+    """
+    Convierte una entrada (número o texto como "1/3", "-2", "0.25") a Fraction
+    si es racional exacta y se pide exactitud, o a float en otro caso
+    """
+    if isinstance(value, str):
+        try:
+            fraction = Fraction(value.strip())
+        except (ValueError, ZeroDivisionError):
+            raise HTTPException(status_code=400, detail=f"Entrada de matriz inválida: '{value}'")
+        return fraction if exact else float(fraction)
+    if isinstance(value, float) and not value.is_integer():
+        return value
+    if not math.isfinite(value):
+        raise HTTPException(status_code=400, detail="La matriz contiene valores no finitos")
+    return Fraction(int(value)) if exact else float(value)
+
+def is_exact_entry(value: MatrixEntry) -> bool:
+    return isinstance(value, (int, str)) or (isinstance(value, float) and value.is_integer())
+
+def to_float_array(values: List[Any]) -> np.ndarray:
+    """Arreglo float (1D o 2D); la vía rápida de NumPy solo falla con textos como "1/3" """
+    try:
+        array = np.asarray(values, dtype=float)
+    except (ValueError, TypeError):
+        if values and isinstance(values[0], list):
+            array = np.asarray([[parse_matrix_entry(v, exact=False) for v in row] for row in values], dtype=float)
+        else:
+            array = np.asarray([parse_matrix_entry(v, exact=False) for v in values], dtype=float)
+    if not np.all(np.isfinite(array)):
+        raise HTTPException(status_code=400, detail="La matriz contiene valores no finitos")
+    return array
+
+def to_exact_matrix(rows: List[List[MatrixEntry]]) -> sp.Matrix:
+    return sp.Matrix([
+        [sp.Rational(f.numerator, f.denominator) for f in (parse_matrix_entry(v, exact=True) for v in row)]
+        for row in rows
+    ])
+
+def parse_matrix_input(matrix: Optional[List[List[MatrixEntry]]], sparse_input: Optional[SparseMatrixInput],
+                       extra: Optional[List[MatrixEntry]] = None) -> ParsedMatrix:
+    """
+    Valida la matriz (densa o en formato COO) y la convierte a la representación
+    adecuada. `extra` (p.ej. el vector b) participa en la decisión de exactitud.
+    """
+    if (matrix is None) == (sparse_input is None):
+        raise HTTPException(status_code=400, detail="Debe enviarse exactamente uno de 'matrix' o 'sparse'")
+
+    if sparse_input is not None:
+        if len(sparse_input.shape) != 2 or min(sparse_input.shape) < 1:
+            raise HTTPException(status_code=400, detail="'shape' debe ser [filas, columnas] positivos")
+        n, m = sparse_input.shape
+        nnz = len(sparse_input.values)
+        if not (len(sparse_input.rows) == len(sparse_input.cols) == nnz):
+            raise HTTPException(status_code=400, detail="'rows', 'cols' y 'values' deben tener la misma longitud")
+        if nnz > MATRIX_MAX_NNZ:
+            raise HTTPException(status_code=400, detail=f"La matriz excede {MATRIX_MAX_NNZ} entradas no nulas")
+        rows = np.asarray(sparse_input.rows, dtype=np.int64)
+        cols = np.asarray(sparse_input.cols, dtype=np.int64)
+        if nnz and (rows.min() < 0 or rows.max() >= n or cols.min() < 0 or cols.max() >= m):
+            raise HTTPException(status_code=400, detail="Índices fuera del rango de 'shape'")
+        values = to_float_array(sparse_input.values)
+        csr = sparse.coo_matrix((values, (rows, cols)), shape=(n, m)).tocsr()
+        return ParsedMatrix((n, m), None, None, csr)
+
+    n = len(matrix)
+    m = len(matrix[0]) if n else 0
+    if n == 0 or m == 0 or any(len(row) != m for row in matrix):
+        raise HTTPException(status_code=400, detail="La matriz debe ser rectangular y no vacía")
+    if max(n, m) > MATRIX_MAX_DENSE_N:
+        raise HTTPException(status_code=400, detail=f"Matriz densa demasiado grande (máximo {MATRIX_MAX_DENSE_N}); use el formato 'sparse'")
+
+    exact = None
+    if max(n, m) <= MATRIX_EXACT_MAX_N and all(is_exact_entry(v) for row in matrix for v in row) \
+            and all(is_exact_entry(v) for v in (extra or [])):
+        exact = to_exact_matrix(matrix)
+    dense = to_float_array(matrix)
+
+    csr = None
+    if n >= MATRIX_SPARSE_MIN_N and np.count_nonzero(dense) <= MATRIX_SPARSE_MAX_DENSITY * n * m:
+        csr = sparse.csr_matrix(dense)
+    return ParsedMatrix((n, m), exact, dense, csr)
+
+def finite_or_none(value: Optional[float]) -> Optional[float]:
+    return float(value) if value is not None and math.isfinite(value) else None
+
+def choose_solve_method(requested: str, parsed: ParsedMatrix) -> str:
+    n, m = parsed.shape
+    if requested != "auto":
+        if requested == "exact" and parsed.exact is None:
+            raise HTTPException(status_code=400, detail=f"El método exacto requiere entradas racionales y n <= {MATRIX_EXACT_MAX_N}")
+        if requested in ("lapack", "lstsq") and parsed.dense is None and max(n, m) > MATRIX_MAX_DENSE_N:
+            raise HTTPException(status_code=400, detail=f"Matriz demasiado grande para un método denso (máximo {MATRIX_MAX_DENSE_N})")
+        if requested not in LEAST_SQUARES_METHODS and n != m:
+            raise HTTPException(status_code=400, detail="El método solicitado requiere una matriz cuadrada")
+        return requested
+    if n != m:
+        # Una entrada dispersa no se densifica: LSMR solo necesita productos A·v y Aᵀ·v
+        return "lstsq" if parsed.dense is not None else "lsmr"
+    if parsed.exact is not None:
+        return "exact"
+    if parsed.sparse is not None:
+        return "sparse_direct"
+    return "lapack"
+
+def solve_linear_system(parsed: ParsedMatrix, b: List[MatrixEntry], method: str,
+                        tol: float, max_iter: Optional[int]) -> Dict[str, Any]:
+    """Resuelve Ax = b con el método indicado y calcula residuo y condición"""
+    n, m = parsed.shape
+    steps = [f"Sistema de {n} ecuaciones con {m} incógnitas"]
+    warnings: List[str] = []
+    result: Dict[str, Any] = {"method": method, "n": m, "iterations": None, "converged": True,
+                              "exact_solution": None, "condition_number": None}
+    condition_label = "norma 1"
+
+    if method == "exact":
+        steps.append("Entradas racionales: eliminación exacta (LU sobre los racionales, sin redondeo)")
+        b_exact = to_exact_matrix([[v] for v in b])
+        dA = DomainMatrix.from_Matrix(parsed.exact).convert_to(sp.QQ)
+        db = DomainMatrix.from_Matrix(b_exact).convert_to(sp.QQ)
+        try:
+            x_exact = dA.lu_solve(db).to_Matrix()
+        except DMNonInvertibleMatrixError:
+            raise HTTPException(status_code=400, detail="La matriz es singular: el sistema no tiene solución única")
+        residual = parsed.exact * x_exact - b_exact
+        x = np.array([float(v) for v in x_exact])
+        result["exact_solution"] = [render_str(v) for v in x_exact]
+        result["residual_norm"] = float(sp.sqrt(sum(v ** 2 for v in residual)))
+        result["condition_number"] = finite_or_none(np.linalg.cond(parsed.dense, 1))
+        b_vec = np.array([float(v) for v in b_exact])
+    else:
+        b_vec = to_float_array(b)
+        A = parsed.sparse if parsed.sparse is not None else parsed.dense
+
+        if method == "lapack":
+            steps.append("Matriz densa: factorización LU de LAPACK (getrf/getrs)")
+            with warnings_module.catch_warnings():
+                # La singularidad se detecta abajo a partir de la diagonal de U
+                warnings_module.simplefilter("ignore", sla.LinAlgWarning)
+                lu, piv = sla.lu_factor(parsed.dense if parsed.dense is not None else A.toarray(), check_finite=False)
+            if np.any(np.diag(lu) == 0):
+                raise HTTPException(status_code=400, detail="La matriz es singular: el sistema no tiene solución única")
+            x = sla.lu_solve((lu, piv), b_vec, check_finite=False)
+            anorm = np.linalg.norm(A.toarray() if sparse.issparse(A) else A, 1)
+            rcond, _ = sla.lapack.dgecon(lu, anorm, norm="1")
+            result["condition_number"] = finite_or_none(1 / rcond) if rcond > 0 else None
+
+        elif method == "lstsq":
+            steps.append("Sistema no cuadrado: mínimos cuadrados (LAPACK gelsd)")
+            dense = parsed.dense if parsed.dense is not None else A.toarray()
+            x, _, rank, singular_values = np.linalg.lstsq(dense, b_vec, rcond=None)
+            if rank < min(n, m):
+                warnings.append(f"Matriz de rango deficiente (rango {rank}): se retorna la solución de norma mínima")
+            if singular_values.size and singular_values[-1] > 0:
+                result["condition_number"] = finite_or_none(singular_values[0] / singular_values[-1])
+                condition_label = "norma 2, σmax/σmin"
+
+        elif method == "lsmr":
+            steps.append(f"Mínimos cuadrados iterativo (LSMR) sobre {'matriz dispersa' if sparse.issparse(A) else 'matriz densa'}")
+            x, istop, itn, _, _, _, conda, _ = spla.lsmr(A, b_vec, atol=tol, btol=tol, maxiter=max_iter)
+            result["iterations"] = int(itn)
+            result["converged"] = istop != 7
+            result["condition_number"] = finite_or_none(conda)
+            condition_label = "estimación de LSMR, norma de Frobenius"
+            if istop == 7:
+                warnings.append("LSMR alcanzó el máximo de iteraciones; revise el residuo")
+            elif istop in (3, 6):
+                warnings.append("LSMR se detuvo por mal condicionamiento; la solución puede no ser confiable")
+
+        elif method == "sparse_direct":
+            A = sparse.csc_matrix(A)
+            steps.append(f"Matriz dispersa ({A.nnz} no ceros): factorización LU dispersa (SuperLU)")
+            try:
+                factor = spla.splu(A)
+            except RuntimeError:
+                raise HTTPException(status_code=400, detail="La matriz es singular: el sistema no tiene solución única")
+            x = factor.solve(b_vec)
+            # Estimación de ||A||_1 ||A^-1||_1 sin formar la inversa
+            inverse = spla.LinearOperator(
+                A.shape, matvec=factor.solve, rmatvec=lambda v: factor.solve(v, trans="T"), dtype=float
+            )
+            result["condition_number"] = finite_or_none(spla.onenormest(A) * spla.onenormest(inverse))
+
+        else:
+            A = sparse.csr_matrix(A)
+            solver = ITERATIVE_SOLVERS[method]
+            kwargs: Dict[str, Any] = {"maxiter": max_iter}
+            if method == "gmres":
+                kwargs["callback_type"] = "pr_norm"  # una llamada por iteración interna
+            if method != "cg":
+                # Precondicionador ILU para los métodos no simétricos
+                try:
+                    ilu = spla.spilu(sparse.csc_matrix(A))
+                    kwargs["M"] = spla.LinearOperator(A.shape, matvec=ilu.solve, dtype=float)
+                    steps.append("Precondicionador ILU incompleto")
+                except RuntimeError:
+                    warnings.append("No se pudo construir el precondicionador ILU")
+            iterations = [0]
+
+            def count_iteration(_):
+                iterations[0] += 1
+
+            steps.append(f"Método iterativo de Krylov: {method}")
+            x, info = solver(A, b_vec, rtol=tol, callback=count_iteration, **kwargs)
+            result["iterations"] = iterations[0]
+            result["converged"] = info == 0
+            if info != 0:
+                warnings.append(f"{method} no convergió (código {info}); revise el residuo")
+
+        residual = (A @ x) - b_vec
+        result["residual_norm"] = float(np.linalg.norm(residual))
+
+    b_norm = float(np.linalg.norm(b_vec))
+    result["relative_residual"] = result["residual_norm"] / b_norm if b_norm > 0 else result["residual_norm"]
+    condition = result["condition_number"]
+    if condition is not None:
+        steps.append(f"Número de condición estimado ({condition_label}): {condition:.3e}")
+        if condition > 1 / np.finfo(float).eps:
+            warnings.append("La matriz está mal condicionada: la solución numérica puede no ser confiable")
+    steps.append(f"Residuo ||Ax - b||₂ = {result['residual_norm']:.3e}")
+
+    result.update(solution=[float(v) for v in x], warnings=warnings, steps=steps)
+    return result
+
+def choose_eigen_method(requested: str, parsed: ParsedMatrix, k: Optional[int]) -> str:
+    n, m = parsed.shape
+    if n != m:
+        raise HTTPException(status_code=400, detail="Los valores propios requieren una matriz cuadrada")
+    if requested != "auto":
+        if requested == "exact" and (parsed.exact is None or n > MATRIX_EXACT_EIGEN_MAX_N):
+            raise HTTPException(status_code=400, detail=f"El método exacto requiere entradas racionales y n <= {MATRIX_EXACT_EIGEN_MAX_N}")
+        if requested == "lapack" and n > MATRIX_MAX_DENSE_N:
+            raise HTTPException(status_code=400, detail=f"Matriz demasiado grande para LAPACK (máximo {MATRIX_MAX_DENSE_N})")
+        return requested
+    if parsed.exact is not None and n <= MATRIX_EXACT_EIGEN_MAX_N:
+        return "exact"
+    if parsed.sparse is not None and n > 2:
+        if n > MATRIX_MAX_DENSE_N:
+            return "sparse"
+        # ARPACK solo calcula k < n - 1 valores propios: sin k (espectro completo)
+        # o con k cercano a n se densifica y se usa LAPACK
+        if k is not None and k < n - 1:
+            return "sparse"
+    return "lapack"
+
+def compute_eigen(parsed: ParsedMatrix, method: str, k: Optional[int], which: str,
+                  vectors: Optional[bool]) -> Dict[str, Any]:
+    """Calcula valores (y opcionalmente vectores) propios con el método indicado"""
+    n = parsed.shape[0]
+    include_vectors = n <= MATRIX_EIGEN_VECTORS_MAX_N if vectors is None else vectors
+    A = parsed.sparse if parsed.sparse is not None else parsed.dense
+    symmetric = bool(abs(A - A.T).max() <= 1e-12 * max(1.0, abs(A).max()))
+    steps = [f"Matriz {n}x{n}" + (" simétrica" if symmetric else "")]
+    warnings: List[str] = []
+    exact_info: List[EigenInfo] = []
+    pairs: List[Tuple[complex, Optional[np.ndarray]]] = []
+
+    if method == "exact":
+        steps.append("Entradas racionales: polinomio característico y valores propios exactos")
+        crootofs: Optional[List[sp.Expr]] = None
+        for value, multiplicity, basis in parsed.exact.eigenvects():
+            # chop descarta la parte imaginaria residual de las fórmulas de Cardano
+            numeric = complex(value.evalf(chop=True))
+            if symmetric:
+                numeric = complex(numeric.real, 0.0)
+            vector = None
+            if include_vectors and basis:
+                vector = np.array([complex(c.evalf(chop=True)) for c in basis[0]])
+                if symmetric:
+                    vector = vector.real
+                vector /= np.linalg.norm(vector)
+            exact = value
+            if numeric.imag == 0 and value.has(sp.I):
+                # Casus irreducibilis: una raíz real solo se expresa con radicales
+                # complejos, así que se muestra como CRootOf del polinomio característico
+                if crootofs is None:
+                    crootofs = sp.Poly(parsed.exact.charpoly(x).as_expr(), x).real_roots()
+                exact = min(crootofs, key=lambda r: abs(float(r) - numeric.real))
+            if len(basis) < multiplicity:
+                warnings.append(f"λ = {render_str(exact)} es defectivo: multiplicidad geométrica {len(basis)} < algebraica {multiplicity}")
+            exact_info.append(EigenInfo(real=numeric.real, imag=numeric.imag, exact=render_str(exact),
+                                        multiplicity=multiplicity, **vector_fields(vector)))
+            pairs.append((numeric, vector))
+        A = parsed.dense
+
+    elif method == "lapack":
+        dense = parsed.dense if parsed.dense is not None else A.toarray()
+        if symmetric:
+            steps.append("LAPACK syevd (matriz simétrica: valores propios reales)")
+            if include_vectors:
+                values, vecs = np.linalg.eigh(dense)
+            else:
+                values, vecs = np.linalg.eigvalsh(dense), None
+        else:
+            steps.append("LAPACK geev (matriz general)")
+            if include_vectors:
+                values, vecs = np.linalg.eig(dense)
+            else:
+                values, vecs = np.linalg.eigvals(dense), None
+        for i in range(len(values)):
+            pairs.append((complex(values[i]), vecs[:, i] if vecs is not None else None))
+        A = dense
+
+    else:
+        limit = n - 1 if symmetric else n - 2
+        if limit < 1:
+            raise HTTPException(status_code=400, detail="La matriz es demasiado pequeña para el método disperso")
+        if k is None:
+            warnings.append(f"Sin k, ARPACK calcula solo {min(6, limit)} de los {n} valores propios: el resultado es parcial")
+        elif k > limit:
+            warnings.append(f"ARPACK calcula como máximo {limit} valores propios de esta matriz; se retornan {limit}")
+        k = min(k or 6, limit)
+        A = sparse.csr_matrix(A)
+        arpack_which = ARPACK_WHICH[symmetric].get(which, which)
+        steps.append(f"ARPACK ({'eigsh' if symmetric else 'eigs'}): {k} valores propios ({arpack_which})")
+        # Los valores propios más pequeños convergen mucho más rápido con shift-invert en 0
+        options: Dict[str, Any] = {"which": arpack_which}
+        if which == "SM":
+            options = {"which": "LM", "sigma": 0}
+            steps.append("Shift-invert con σ = 0 para los valores propios de menor magnitud")
+        eigen_solver = spla.eigsh if symmetric else spla.eigs
+        try:
+            try:
+                values, vecs = eigen_solver(A, k=k, return_eigenvectors=True, **options)
+            except spla.ArpackNoConvergence:
+                # Subclase de RuntimeError: no es un fallo de la factorización
+                raise
+            except RuntimeError:
+                if "sigma" not in options:
+                    raise
+                # Matriz singular: no se puede factorizar A - 0·I
+                warnings.append("A es singular; se usa ARPACK sin shift-invert")
+                values, vecs = eigen_solver(A, k=k, which="SM", return_eigenvectors=True)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Parámetros inválidos para ARPACK: {e}")
+        except spla.ArpackNoConvergence as e:
+            warnings.append(f"ARPACK no convergió para todos los valores propios ({len(e.eigenvalues)} de {k})")
+            values, vecs = e.eigenvalues, e.eigenvectors
+        for i in range(len(values)):
+            pairs.append((complex(values[i]), vecs[:, i]))
+
+    # Mismo orden (y recorte a k) para todos los métodos
+    order = EIGEN_ORDER[which]
+    ranking = sorted(range(len(pairs)), key=lambda i: (order(pairs[i][0]), pairs[i][0].real, pairs[i][0].imag))
+    if k is not None and method != "sparse":
+        if method == "exact":
+            # k cuenta multiplicidades; el último valor se incluye completo
+            selected, count = [], 0
+            for i in ranking:
+                if count >= k:
+                    break
+                selected.append(i)
+                count += exact_info[i].multiplicity
+            ranking = selected
+        else:
+            ranking = ranking[:k]
+        steps.append(f"Se retornan {len(ranking)} valores propios según el criterio {which}")
+    pairs = [pairs[i] for i in ranking]
+
+    # Residuo ||Av - λv|| por par, independiente del método
+    residuals = [float(np.linalg.norm(A @ v - value * v)) for value, v in pairs if v is not None]
+    max_residual = max(residuals) if residuals else None
+    if method == "exact":
+        eigenvalues = [exact_info[i] for i in ranking]
+    else:
+        eigenvalues = [
+            EigenInfo(real=value.real, imag=value.imag, **vector_fields(v if include_vectors else None))
+            for value, v in pairs
+        ]
+    if max_residual is not None:
+        steps.append(f"Residuo máximo ||Av - λv||₂ = {max_residual:.3e}")
+
+    return {"method": method, "n": n, "symmetric": symmetric, "eigenvalues": eigenvalues,
+            "max_residual": finite_or_none(max_residual), "warnings": warnings, "steps": steps}
+
+def vector_fields(vector: Optional[np.ndarray]) -> Dict[str, Optional[List[float]]]:
+    """Campos vector / vector_imag de EigenInfo (la parte imaginaria solo si existe)"""
+    if vector is None:
+        return {}
+    fields = {"vector": [float(c) for c in np.real(vector)]}
+    if np.iscomplexobj(vector) and np.any(np.imag(vector) != 0):
+        fields["vector_imag"] = [float(c) for c in np.imag(vector)]
+    return fields
+
+async def run_in_matrix_pool(func, *args):
+    """Ejecuta el cálculo matricial fuera del event loop (NumPy/LAPACK liberan el GIL)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_matrix_executor, copy_context().run, run_traced, func, *args)
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Endpoint de salud del servicio"""
@@ -190,6 +1696,35 @@ async def health_check():
         message="Servicio de cálculo simbólico funcionando correctamente"
     )
 
+@app.get("/admin/slow-requests", dependencies=[Depends(require_admin)])
+async def list_slow_requests(limit: int = 20, operation: Optional[str] = None):
+    """
+    Lista las requests más lentas registradas (peores primero)
+    """
+    entries = [e for e in slow_log if operation is None or e["operation"] == operation]
+    entries.sort(key=lambda e: e["duration_ms"], reverse=True)
+    return {
+        "threshold_ms": SLOW_REQUEST_THRESHOLD_MS,
+        "total": len(entries),
+        "requests": entries[:max(limit, 0)]
+    }
+
+@app.delete("/admin/slow-requests", dependencies=[Depends(require_admin)])
+async def clear_slow_requests():
+    """Vacía el slow log"""
+    slow_log.clear()
+    return {"status": "ok"}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """
+    Retorna un perfil capturado con la cabecera X-Profile o ?profile=1
+    """
+    entry = profile_store.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Perfil no encontrado: {profile_id}")
+    return entry
+
 @app.post("/function/evaluate", response_model=FunctionResponse)
 async def evaluate_function(request: FunctionRequest):
     """
@@ -197,26 +1732,34 @@ async def evaluate_function(request: FunctionRequest):
     """
     try:
         logger.info(f"Evaluando función: {request.function} en x={request.value}")
+        trace_request("evaluate", request.function)
         
         if request.value is None:
             raise HTTPException(status_code=400, detail="Se requiere un valor para evaluar")
         
         # Parsear función
-        expr = parse_function(request.function, request.variable)
+        with stage("parse"):
+            expr = parse_function(request.function, request.variable)
         
         # Evaluar en el punto
-        result_value = expr.subs(request.variable, request.value)
-        result_simplified = simplify(result_value)
+        with stage("evaluate"):
+            result_value = expr.subs(request.variable, request.value)
+        with stage("simplify"):
+            result_simplified = simplify(result_value)
         
-        # Generar pasos
-        steps = generate_steps("evaluate", expr, result_simplified, request.variable)
+        # Renderizar resultado, pasos y LaTeX fuera del event loop
+        rendered = await run_in_render_pool(
+            render_result, "evaluate", expr, result_simplified, request.variable,
+            request.include_steps, request.include_latex
+        )
         
         return FunctionResponse(
             operation="evaluate",
             function=request.function,
-            result=str(result_simplified),
-            steps=steps,
-            latex_result=latex(result_simplified)
+            result=rendered.result,
+            steps=rendered.steps,
+            latex_result=rendered.latex_result,
+            truncated=rendered.truncated
         )
         
     except Exception as e:
@@ -230,23 +1773,31 @@ async def derive_function(request: FunctionRequest):
     """
     try:
         logger.info(f"Derivando función: {request.function}")
+        trace_request("derive", request.function)
         
         # Parsear función
-        expr = parse_function(request.function, request.variable)
+        with stage("parse"):
+            expr = parse_function(request.function, request.variable)
         
         # Calcular derivada
-        derivative = diff(expr, sp.Symbol(request.variable))
-        derivative_simplified = simplify(derivative)
+        with stage("derive"):
+            derivative = diff(expr, sp.Symbol(request.variable))
+        with stage("simplify"):
+            derivative_simplified = simplify(derivative)
         
-        # Generar pasos
-        steps = generate_steps("derive", expr, derivative_simplified, request.variable)
+        # Renderizar resultado, pasos y LaTeX fuera del event loop
+        rendered = await run_in_render_pool(
+            render_result, "derive", expr, derivative_simplified, request.variable,
+            request.include_steps, request.include_latex
+        )
         
         return FunctionResponse(
             operation="derive",
             function=request.function,
-            result=str(derivative_simplified),
-            steps=steps,
-            latex_result=latex(derivative_simplified)
+            result=rendered.result,
+            steps=rendered.steps,
+            latex_result=rendered.latex_result,
+            truncated=rendered.truncated
         )
         
     except Exception as e:
@@ -260,86 +1811,32 @@ async def integrate_function(request: FunctionRequest):
     """
     try:
         logger.info(f"Integrando función: {request.function}")
+        trace_request("integrate", request.function)
         
         # Validar entrada
         if not request.function or not request.function.strip():
             raise HTTPException(status_code=400, detail="La función no puede estar vacía")
         
         # Parsear función
-        expr = parse_function(request.function, request.variable)
-        
-        # Inicializar variables
-        integral = None
-        integral_simplified = None
-        result_str = ""
-        latex_result = None
-        
-        # Verificar que la expresión sea integrable
-        if expr.is_number and not expr.is_zero:
-            # Para constantes, la integral es c*x
-            integral = expr * sp.Symbol(request.variable)
-            integral_simplified = simplify(integral)
-            result_str = str(integral_simplified)
-            latex_result = latex(integral)
-        else:
-            # Calcular integral
-            try:
-                integral = sp.integrate(expr, sp.Symbol(request.variable))
-                
-                # Si la integral no se puede resolver simbólicamente
-                if integral == expr:
-                    # Intentar métodos alternativos
-                    try:
-                        # Para funciones racionales
-                        if expr.is_rational_function():
-                            integral = sp.integrate(expr, sp.Symbol(request.variable))
-                        elif expr.is_polynomial():
-                            # Para polinomios, usar integración directa
-                            integral = sp.integrate(expr, sp.Symbol(request.variable))
-                        else:
-                            # Integral no resuelta simbólicamente
-                            result_str = f"Integral no resuelta simbólicamente: ∫{expr} d{request.variable}"
-                            integral_simplified = result_str
-                            latex_result = None
-                    except Exception as alt_error:
-                        logger.warning(f"Error en método alternativo: {alt_error}")
-                        result_str = f"Integral no resuelta simbólicamente: ∫{expr} d{request.variable}"
-                        integral_simplified = result_str
-                        latex_result = None
-                
-                # Solo procesar si integral es una expresión válida
-                if isinstance(integral, sp.Expr):
-                    integral_simplified = simplify(integral)
-                    result_str = str(integral_simplified)
-                    latex_result = latex(integral)
-                elif isinstance(integral, str):
-                    result_str = integral
-                    integral_simplified = integral
-                    latex_result = None
-                    
-            except Exception as int_error:
-                logger.warning(f"Error específico en integración: {int_error}")
-                # Proporcionar información útil sobre el error
-                if "not implemented" in str(int_error):
-                    result_str = f"Integral no implementada para esta expresión: ∫{expr} d{request.variable}"
-                elif "convergence" in str(int_error):
-                    result_str = f"Problema de convergencia en la integral: ∫{expr} d{request.variable}"
-                elif "division by zero" in str(int_error):
-                    result_str = f"División por cero en la función: {expr}"
-                else:
-                    result_str = f"No se pudo calcular la integral: ∫{expr} d{request.variable}"
-                integral_simplified = result_str
-                latex_result = None
+        with stage("parse"):
+            expr = parse_function(request.function, request.variable)
+        
+        with stage("integrate"):
+            integral_simplified, latex_expr = compute_integral(expr, request.variable)
         
-        # Generar pasos
-        steps = generate_steps("integrate", expr, integral_simplified if isinstance(integral_simplified, sp.Expr) else expr, request.variable)
+        # Renderizar resultado, pasos y LaTeX fuera del event loop
+        rendered = await run_in_render_pool(
+            render_result, "integrate", expr, integral_simplified, request.variable,
+            request.include_steps, request.include_latex and latex_expr is not None, latex_expr
+        )
         
         return FunctionResponse(
             operation="integrate",
             function=request.function,
-            result=result_str,
-            steps=steps,
-            latex_result=latex_result
+            result=rendered.result,
+            steps=rendered.steps,
+            latex_result=rendered.latex_result,
+            truncated=rendered.truncated
         )
         
     except HTTPException:
@@ -363,28 +1860,260 @@ async def simplify_function(request: FunctionRequest):
     """
     try:
         logger.info(f"Simplificando función: {request.function}")
+        trace_request("simplify", request.function)
         
         # Parsear función
-        expr = parse_function(request.function, request.variable)
+        with stage("parse"):
+            expr = parse_function(request.function, request.variable)
         
         # Simplificar
-        simplified = simplify(expr)
+        with stage("simplify"):
+            simplified = simplify(expr)
         
-        # Generar pasos
-        steps = generate_steps("simplify", expr, simplified, request.variable)
+        # Renderizar resultado, pasos y LaTeX fuera del event loop
+        rendered = await run_in_render_pool(
+            render_result, "simplify", expr, simplified, request.variable,
+            request.include_steps, request.include_latex
+        )
         
         return FunctionResponse(
             operation="simplify",
             function=request.function,
-            result=str(simplified),
-            steps=steps,
-            latex_result=latex(simplified)
+            result=rendered.result,
+            steps=rendered.steps,
+            latex_result=rendered.latex_result,
+            truncated=rendered.truncated
         )
         
     except Exception as e:
         logger.error(f"Error en simplificación: {e}")
         raise HTTPException(status_code=500, detail=f"Error en simplificación: {str(e)}")
 
+@app.post("/function/solve", response_model=SolveResponse)
+async def solve_function(request: SolveRequest):
+    """
+    Encuentra las raíces de f(x) = 0 en un intervalo.
+    Intenta solveset con un presupuesto de tiempo y, si no termina o el
+    resultado no es finito, recurre a barrido numérico + Brent/Newton.
+    """
+    try:
+        logger.info(f"Resolviendo f(x) = 0: {request.function} en [{request.interval_min}, {request.interval_max}]")
+        trace_request("solve", request.function)
+        
+        a, b = request.interval_min, request.interval_max
+        if not (math.isfinite(a) and math.isfinite(b)) or a >= b:
+            raise HTTPException(status_code=400, detail="El intervalo debe ser finito y cumplir interval_min < interval_max")
+        if not 10 <= request.samples <= SOLVE_MAX_SAMPLES:
+            raise HTTPException(status_code=400, detail=f"samples debe estar entre 10 y {SOLVE_MAX_SAMPLES}")
+        
+        # Parsear función
+        with stage("parse"):
+            expr = parse_function(request.function, request.variable)
+        extra_symbols = {str(s) for s in expr.free_symbols} - {request.variable}
+        if extra_symbols:
+            raise HTTPException(status_code=400, detail=f"La función solo puede depender de '{request.variable}'; encontradas: {sorted(extra_symbols)}")
+        if expr.is_zero:
+            raise HTTPException(status_code=400, detail=IDENTICALLY_ZERO_MESSAGE)
+        
+        steps = [f"f({request.variable}) = {render_str(expr)}", f"Resolviendo f({request.variable}) = 0 en [{a}, {b}]"]
+        budget = SOLVE_SYMBOLIC_TIMEOUT_S if request.timeout is None else max(0.0, min(request.timeout, SOLVE_SYMBOLIC_TIMEOUT_S))
+        
+        # Intento simbólico con presupuesto de tiempo
+        roots = None
+        symbolic_note = "solveset no retornó un conjunto finito de raíces"
+        if budget > 0:
+            with stage("solveset", attach=False):
+                deadline = time.monotonic() + budget
+                loop = asyncio.get_running_loop()
+                try:
+                    roots = await loop.run_in_executor(
+                        _solve_executor, copy_context().run, run_traced,
+                        solve_workers.solve, deadline, expr, request.variable, a, b
+                    )
+                except TimeoutError:
+                    symbolic_note = f"solveset no terminó en {budget} s"
+                except Exception as sym_error:
+                    logger.warning(f"solveset falló para '{request.function}': {sym_error}")
+                    symbolic_note = "solveset no pudo resolver la ecuación"
+        
+        if roots is not None:
+            engine = "symbolic"
+            steps.append("Resuelto simbólicamente con solveset")
+        else:
+            engine = "numeric"
+            if budget > 0:
+                steps.append(symbolic_note)
+            steps.append("Usando búsqueda numérica de raíces")
+            with stage("numeric", attach=False):
+                node, _ = expression_graph.register(expr, request.variable)
+                loop = asyncio.get_running_loop()
+                try:
+                    roots, numeric_steps = await loop.run_in_executor(
+                        _numeric_solve_executor, copy_context().run, run_traced,
+                        solve_numeric, node, a, b, request.samples
+                    )
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            steps.extend(numeric_steps)
+        
+        if roots:
+            steps.append("Raíces: " + ", ".join(
+                f"{r.exact or r.value}" + (f" (multiplicidad {r.multiplicity})" if r.multiplicity > 1 else "")
+                for r in roots
+            ))
+        else:
+            steps.append("No se encontraron raíces en el intervalo")
+        
+        return SolveResponse(
+            function=request.function,
+            variable=request.variable,
+            interval=[a, b],
+            engine=engine,
+            roots=roots,
+            steps=steps
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error resolviendo ecuación: {e}")
+        raise HTTPException(status_code=500, detail=f"Error resolviendo ecuación: {str(e)}")
+
+@app.post("/graph/functions", response_model=GraphNodeResponse)
+async def register_graph_function(request: GraphRegisterRequest):
+    """
+    Registra una función en el grafo de expresiones y retorna su id
+    """
+    try:
+        logger.info(f"Registrando función en el grafo: {request.function}")
+        trace_request("graph_register", request.function)
+        
+        with stage("parse"):
+            expr = parse_function(request.function, request.variable)
+        
+        node, cached = expression_graph.register(expr, request.variable)
+        # Si la expresión ya existía como nodo derivado, se presenta igualmente como raíz
+        return await node_response(node, cached, as_root=True)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error registrando función: {e}")
+        raise HTTPException(status_code=500, detail=f"Error registrando función: {str(e)}")
+
+@app.get("/graph/nodes/{node_id}", response_model=GraphNodeResponse)
+async def get_graph_node(node_id: str):
+    """
+    Retorna un nodo del grafo de expresiones
+    """
+    node = expression_graph.get(node_id)
+    if node is None:
+        raise HTTPException(status_code=404, detail=f"Nodo no encontrado: {node_id}")
+    return await node_response(node, True)
+
+@app.post("/graph/nodes/{node_id}/evaluate", response_model=GraphEvaluateResponse)
+async def evaluate_graph_node(node_id: str, request: GraphEvaluateRequest):
+    """
+    Evalúa un nodo del grafo usando su evaluador compilado (memoizado por valor)
+    """
+    node = expression_graph.get(node_id)
+    if node is None:
+        raise HTTPException(status_code=404, detail=f"Nodo no encontrado: {node_id}")
+    trace_request("graph_evaluate", render_str(node.expr))
+    
+    try:
+        result, numeric, cached = await run_in_graph_pool(expression_graph.evaluate, node, request.value)
+        return GraphEvaluateResponse(
+            id=node.id,
+            value=request.value,
+            result=result,
+            numeric_result=numeric,
+            cached=cached
+        )
+    except Exception as e:
+        logger.error(f"Error evaluando nodo {node_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error en evaluación: {str(e)}")
+
+@app.post("/graph/nodes/{node_id}/{operation}", response_model=GraphNodeResponse)
+async def derive_graph_node(node_id: str, operation: str):
+    """
+    Obtiene el nodo derivado (derive, integrate, simplify) de un nodo del grafo.
+    Se calcula solo la primera vez; las siguientes requests lo reutilizan.
+    """
+    if operation not in GRAPH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Operación no soportada: {operation}")
+    node = expression_graph.get(node_id)
+    if node is None:
+        raise HTTPException(status_code=404, detail=f"Nodo no encontrado: {node_id}")
+    logger.info(f"Grafo: {operation} del nodo {node_id}")
+    trace_request(f"graph_{operation}", render_str(node.expr))
+    
+    try:
+        child, cached = await run_in_graph_pool(expression_graph.derived, node, operation)
+        return await node_response(child, cached, parent=node, operation=operation)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error en {operation} del nodo {node_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error en {operation}: {str(e)}")
+
+@app.post("/matrix/solve", response_model=MatrixSolveResponse)
+async def solve_matrix_system(request: MatrixSolveRequest):
+    """
+    Resuelve el sistema lineal Ax = b eligiendo el método según la entrada
+    (exacto, LAPACK, mínimos cuadrados, disperso directo o iterativo)
+    """
+    try:
+        if request.method not in SOLVE_METHODS:
+            raise HTTPException(status_code=400, detail=f"Método no soportado: {request.method}. Opciones: {', '.join(SOLVE_METHODS)}")
+        
+        with stage("parse"):
+            parsed = parse_matrix_input(request.matrix, request.sparse, request.b)
+        trace_request("matrix_solve", f"matriz {parsed.shape[0]}x{parsed.shape[1]}")
+        if len(request.b) != parsed.shape[0]:
+            raise HTTPException(status_code=400, detail=f"b debe tener {parsed.shape[0]} entradas")
+        
+        method = choose_solve_method(request.method, parsed)
+        logger.info(f"Resolviendo sistema {parsed.shape[0]}x{parsed.shape[1]} con método {method}")
+        with stage("solve", attach=False):
+            result = await run_in_matrix_pool(solve_linear_system, parsed, request.b, method, request.tol, request.max_iter)
+        return MatrixSolveResponse(**result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error resolviendo sistema lineal: {e}")
+        raise HTTPException(status_code=500, detail=f"Error resolviendo sistema lineal: {str(e)}")
+
+@app.post("/matrix/eigen", response_model=MatrixEigenResponse)
+async def matrix_eigen(request: MatrixEigenRequest):
+    """
+    Calcula valores y vectores propios (exactos, LAPACK o ARPACK para matrices dispersas)
+    """
+    try:
+        if request.method not in EIGEN_METHODS:
+            raise HTTPException(status_code=400, detail=f"Método no soportado: {request.method}. Opciones: {', '.join(EIGEN_METHODS)}")
+        if request.which not in EIGEN_ORDER:
+            raise HTTPException(status_code=400, detail=f"Criterio 'which' no soportado: {request.which}. Opciones: {', '.join(EIGEN_ORDER)}")
+        
+        with stage("parse"):
+            parsed = parse_matrix_input(request.matrix, request.sparse)
+        trace_request("matrix_eigen", f"matriz {parsed.shape[0]}x{parsed.shape[1]}")
+        if request.k is not None and not 1 <= request.k <= parsed.shape[0]:
+            raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {parsed.shape[0]}")
+        
+        method = choose_eigen_method(request.method, parsed, request.k)
+        logger.info(f"Valores propios de matriz {parsed.shape[0]}x{parsed.shape[1]} con método {method}")
+        with stage("eigen", attach=False):
+            result = await run_in_matrix_pool(compute_eigen, parsed, method, request.k, request.which, request.vectors)
+        return MatrixEigenResponse(**result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error calculando valores propios: {e}")
+        raise HTTPException(status_code=500, detail=f"Error calculando valores propios: {str(e)}")
+
 @app.get("/examples")
 async def get_examples():
     """